@@ -4,9 +4,19 @@ Searches for terms in Column D and extracts corresponding values from Column W
 Preserves data integrity by working directly with .xlsx files
 """
 
-from openpyxl import load_workbook, Workbook
+from openpyxl import Workbook
+from xlsx_stream import iter_rows
+import os
+import re
 import sys
 
+
+# Project folders - defaults to the repo root, override with the ROBINSONS_ROOT environment variable
+ROOT = os.environ.get("ROBINSONS_ROOT", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RAW_DIR = os.path.join(ROOT, "raw")
+DATA_DIR = os.path.join(ROOT, "data")
+
+
 def extract_handles(input_file, search_terms, output_file):
     """
     Extract handles based on search terms in Column D
@@ -18,58 +28,43 @@ def extract_handles(input_file, search_terms, output_file):
     """
     
     print(f"\nLoading workbook: {input_file}")
-    wb = load_workbook(input_file, read_only=True, data_only=True)
-    ws = wb.active
-    
-    # Create output workbook
-    output_wb = Workbook()
-    output_ws = output_wb.active
+    # Stream only Column D and Column W straight from the sheet XML
+    rows = iter_rows(input_file, columns=('D', 'W'))
     
-    # Column indices (1-based for openpyxl)
-    col_d = 4   # Column D
-    col_w = 23  # Column W
+    # Create output workbook (write-only: rows stream straight to the file)
+    output_wb = Workbook(write_only=True)
+    output_ws = output_wb.create_sheet()
     
     # Get headers from first row
-    header_d = ws.cell(row=1, column=col_d).value
-    header_w = ws.cell(row=1, column=col_w).value
+    header_d, header_w = next(rows, (None, None))
     
     # Write headers to output
-    output_ws.cell(row=1, column=1, value=header_d)
-    output_ws.cell(row=1, column=2, value=header_w)
+    output_ws.append([header_d, header_w])
     
     print(f"Headers: [{header_d}] and [{header_w}]")
     print(f"\nSearching for terms: {', '.join(search_terms)}")
     print(f"Searching in Column D...")
     
-    # Track output row
-    output_row = 2
     matches_found = 0
     
-    # Iterate through all rows (starting from row 2 to skip header)
-    # Using iter_rows for better compatibility with read_only mode
-    for row in ws.iter_rows(min_row=2):
-        cell_d_value = row[col_d - 1].value  # -1 because iter_rows uses 0-based indexing
-        
+    # Lowercase the search terms once (deduplicated, e.g. "Socks, socks")
+    terms_lower = sorted({term.lower() for term in search_terms})
+    
+    # All search terms in one compiled pattern, so each cell is scanned once
+    # for every term (one entry per row even if several terms match)
+    terms_pattern = re.compile('|'.join(re.escape(term) for term in terms_lower))
+    
+    # Iterate through all remaining rows (header already consumed)
+    for cell_d_value, cell_w_value in rows:
         # Convert to string for comparison, handle None values
         if cell_d_value is not None:
             cell_d_str = str(cell_d_value).strip()
             
             # Check if any search term matches
-            for term in search_terms:
-                if term.lower() in cell_d_str.lower():
-                    # Match found! Extract both Column D and Column W values
-                    cell_w_value = row[col_w - 1].value  # -1 because iter_rows uses 0-based indexing
-                    
-                    # Write to output file
-                    output_ws.cell(row=output_row, column=1, value=cell_d_value)
-                    output_ws.cell(row=output_row, column=2, value=cell_w_value)
-                    
-                    output_row += 1
-                    matches_found += 1
-                    break  # Avoid duplicate entries if multiple terms match
-    
-    # Close input workbook
-    wb.close()
+            if terms_pattern.search(cell_d_str.lower()):
+                # Match found! Write both Column D and Column W values
+                output_ws.append([cell_d_value, cell_w_value])
+                matches_found += 1
     
     # Save output workbook
     output_wb.save(output_file)
@@ -89,7 +84,7 @@ def main():
     print("="*60)
     
     # Input file (fixed)
-    input_file = "raw/collections-raw.xlsx"
+    input_file = os.path.join(RAW_DIR, "collections-raw.xlsx")
     
     # Get search terms from user
     print("\nEnter the term(s) to search for in Column D.")
@@ -112,7 +107,7 @@ def main():
     term_for_filename = search_terms[0] if len(search_terms) == 1 else '-'.join(search_terms)
     # Clean filename (remove special characters)
     term_for_filename = ''.join(c for c in term_for_filename if c.isalnum() or c in ['-', '_'])
-    output_file = f"data/{term_for_filename}-handles.xlsx"
+    output_file = os.path.join(DATA_DIR, f"{term_for_filename}-handles.xlsx")
     
     # Extract handles
     try:
@@ -125,7 +120,7 @@ def main():
             
     except FileNotFoundError:
         print(f"\n✗ Error: Could not find input file '{input_file}'")
-        print("Please ensure the file exists in the current directory")
+        print("Please ensure collections-raw.xlsx exists in the raw/ directory")
         sys.exit(1)
     except Exception as e:
         print(f"\n✗ Error: {str(e)}")
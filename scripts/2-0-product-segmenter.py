@@ -4,11 +4,44 @@ Matches handles from a reference file against the master products-raw.xlsx file
 and extracts all matching rows while preserving data integrity
 """
 
-from openpyxl import load_workbook, Workbook
+from openpyxl import Workbook
+from xlsx_stream import iter_rows
 import sys
 import os
+import re
+import string
 import unicodedata
+from functools import lru_cache
 
+# Project folders - defaults to the repo root, override with the ROBINSONS_ROOT environment variable
+ROOT = os.environ.get("ROBINSONS_ROOT", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RAW_DIR = os.path.join(ROOT, "raw")
+DATA_DIR = os.path.join(ROOT, "data")
+
+# Problematic Unicode symbols that NFKD would convert to letters
+# ™ (U+2122) → "TM", ® (U+00AE) → "R", etc.
+PROBLEMATIC_SYMBOLS = str.maketrans('', '', (
+    '\u2122'  # ™ TRADE MARK SIGN
+    '\u00AE'  # ® REGISTERED SIGN
+    '\u00A9'  # © COPYRIGHT SIGN
+    '\u2120'  # ℠ SERVICE MARK
+))
+
+# Anything that is not an ASCII letter, digit or hyphen
+# (NFKD can produce uppercase ASCII, e.g. ℌ → H, which has always been kept)
+DISALLOWED_CHARS = re.compile(r'[^A-Za-z0-9-]+')
+REPEATED_HYPHENS = re.compile(r'-{2,}')
+
+# A handle that is already normalized: lowercase words joined by single hyphens
+CLEAN_HANDLE = re.compile(r'[a-z0-9]+(?:-[a-z0-9]+)*')
+
+# ASCII fast path: one bytes.translate call maps A-Z → a-z and deletes every
+# other byte that is not a letter, digit or hyphen
+ASCII_LOWERCASE = bytes.maketrans(string.ascii_uppercase.encode(), string.ascii_lowercase.encode())
+ASCII_DISALLOWED = bytes(byte for byte in range(128) if not (chr(byte).isalnum() or chr(byte) == '-'))
+REPEATED_HYPHENS_BYTES = re.compile(rb'-{2,}')
+
+@lru_cache(maxsize=None)
 def normalize_handle(handle):
     """
     Normalize handle for matching purposes ONLY (original data is preserved in output)
@@ -25,8 +58,10 @@ def normalize_handle(handle):
     - Unicode encoding variations
     - Case differences
     
+    Results are cached - variants share a handle, so most calls are a lookup.
+    
     Args:
-        handle: The handle string to normalize
+        handle: The handle string to normalize (callers pass a str)
         
     Returns:
         Normalized handle string for matching (ASCII alphanumeric + hyphens only)
@@ -34,24 +69,31 @@ def normalize_handle(handle):
     if not handle:
         return ""
     
-    # Step 1: Convert to string and lowercase
-    normalized = str(handle).lower()
-    
-    # Step 2: Remove problematic Unicode symbols that NFKD would convert to letters
-    # ™ (U+2122) → "TM", ® (U+00AE) → "R", etc.
-    # Remove these BEFORE NFKD to prevent them becoming ASCII letters
-    problematic_symbols = [
-        '\u2122',  # ™ TRADE MARK SIGN
-        '\u00AE',  # ® REGISTERED SIGN  
-        '\u00A9',  # © COPYRIGHT SIGN
-        '\u2120',  # ℠ SERVICE MARK
-    ]
-    for symbol in problematic_symbols:
-        normalized = normalized.replace(symbol, '')
-    
-    # Step 3: Apply NFKD normalization for accented characters
-    # This decomposes é → e + ´, ñ → n + ˜, etc.
-    normalized = unicodedata.normalize('NFKD', normalized)
+    # Already-clean Shopify slugs come back unchanged (one regex match)
+    if CLEAN_HANDLE.fullmatch(handle):
+        return handle
+    
+    # Fast path for pure ASCII handles (nearly every Shopify slug):
+    # Steps 1, 4 and 5 below in a couple of C-level bytes operations
+    if handle.isascii():
+        normalized = handle.encode('ascii').translate(ASCII_LOWERCASE, ASCII_DISALLOWED)
+        if b'--' in normalized:
+            normalized = REPEATED_HYPHENS_BYTES.sub(b'-', normalized)
+        return normalized.strip(b'-').decode('ascii')
+    
+    # Step 1: Lowercase
+    normalized = handle.lower()
+    
+    # Steps 2-3 only touch non-ASCII characters - skip both passes if
+    # lowercasing already left plain ASCII (e.g. KELVIN SIGN → k)
+    if not normalized.isascii():
+        # Step 2: Remove problematic Unicode symbols that NFKD would convert to letters
+        # Remove these BEFORE NFKD to prevent them becoming ASCII letters
+        normalized = normalized.translate(PROBLEMATIC_SYMBOLS)
+        
+        # Step 3: Apply NFKD normalization for accented characters
+        # This decomposes é → e + ´, ñ → n + ˜, etc.
+        normalized = unicodedata.normalize('NFKD', normalized)
     
     # Step 4: Keep ONLY ASCII alphanumeric and hyphens
     # This removes:
@@ -59,19 +101,12 @@ def normalize_handle(handle):
     # - All combining diacritics (the accent marks after decomposition)
     # - All non-ASCII characters
     # - All punctuation except hyphens
-    result = []
-    for char in normalized:
-        # Only keep ASCII alphanumeric (a-z, 0-9) and hyphens
-        if (char.isascii() and char.isalnum()) or char == '-':
-            result.append(char)
-    
-    normalized = ''.join(result)
+    normalized = DISALLOWED_CHARS.sub('', normalized)
     
     # Step 5: Clean up multiple consecutive hyphens and strip
-    while '--' in normalized:
-        normalized = normalized.replace('--', '-')
+    normalized = REPEATED_HYPHENS.sub('-', normalized)
     
-    return normalized.strip('-').strip()
+    return normalized.strip('-')
 
 def extract_handles_from_reference(reference_file):
     """
@@ -86,20 +121,20 @@ def extract_handles_from_reference(reference_file):
         - handle_mapping_dict: Maps normalized → original handle (preserves ™, ®, © etc.)
     """
     print(f"\nLoading reference file: {reference_file}")
-    wb = load_workbook(reference_file, read_only=True, data_only=True)
-    ws = wb.active
+    # Stream only Column B - cells in other columns are skipped without
+    # resolving their shared strings
+    rows = iter_rows(reference_file, columns=('B',))
     
-    col_b = 2  # Column B
     normalized_handles = set()
     handle_mapping = {}  # normalized → original
     
     # Verify header (should be 'Product: Handle' in Column B)
-    header_b = ws.cell(row=1, column=col_b).value
+    header_b = next(rows, [None])[0]
     print(f"Column B header: [{header_b}]")
     
-    # Extract all handles from Column B (starting from row 2)
-    for row in ws.iter_rows(min_row=2):
-        handle_value = row[col_b - 1].value  # -1 for 0-based indexing
+    # Extract all handles from Column B (remaining rows, header consumed)
+    for row in rows:
+        handle_value = row[0]  # Column B (only column requested)
         
         if handle_value is not None:
             handle_str = str(handle_value).strip()
@@ -110,106 +145,138 @@ def extract_handles_from_reference(reference_file):
                 # Map normalized → ORIGINAL handle (with special chars intact)
                 handle_mapping[normalized] = handle_str
     
-    wb.close()
-    
     print(f"✓ Found {len(normalized_handles)} unique handle(s) in reference file")
     
     return normalized_handles, handle_mapping
 
 
-def extract_matching_rows(master_file, handles, handle_mapping):
+def read_header_row(master_file):
     """
-    Extract all rows from master file that match the provided handles
-    Uses Unicode normalization for matching while preserving reference handles
+    Read the header row of the master file
     
     Args:
         master_file: Path to the master products-raw.xlsx file
-        handles: Set of NORMALIZED handles to match against
-        handle_mapping: Dict mapping normalized → original reference handle
         
     Returns:
-        Tuple of (matching_rows, header_row, total_rows_processed)
+        List of header values
     """
     print(f"\nLoading master file: {master_file}")
-    wb = load_workbook(master_file, read_only=True, data_only=True)
-    ws = wb.active
+    header_row = next(iter_rows(master_file, max_row=1), [])
+    print(f"Master file has {len(header_row)} columns")
+    return header_row
+
+
+def iter_matching_rows(master_file, handles, handle_mapping, stats):
+    """
+    Stream all rows from master file that match the provided handles
+    Uses Unicode normalization for matching while preserving reference handles
     
-    col_b = 2  # Column B (Product: Handle)
-    col_b_idx = col_b - 1  # 0-based index
+    Rows are yielded one at a time so they can go straight into the output
+    workbook - matched rows are never all held in memory at once.
     
-    # Get header row
-    header_row = []
-    for cell in ws[1]:
-        header_row.append(cell.value)
+    Args:
+        master_file: Path to the master products-raw.xlsx file
+        handles: Set of NORMALIZED handles to match against
+        handle_mapping: Dict mapping normalized → original reference handle
+        stats: Dict updated with 'total_rows_processed' and 'matching_rows'
+        
+    Yields:
+        Each matching row (list of cell values) with Column B replaced by
+        the original reference handle
+    """
+    col_b_idx = 1  # Column B (Product: Handle), 0-based index
     
-    print(f"Master file has {len(header_row)} columns")
     print(f"Searching for matching handles in Column B...")
     print(f"Using Unicode normalization for robust matching...")
     
-    matching_rows = []
-    total_rows_processed = 0
-    
-    # Iterate through all rows (starting from row 2 to skip header)
-    for row in ws.iter_rows(min_row=2):
-        total_rows_processed += 1
+    # Variants repeat their product's handle, so remember each handle's
+    # normalized form (plain dict lookup, cheaper than the lru_cache wrapper)
+    normalized_cache = {}
+    
+    def is_matching_handle(handle_value):
+        """Check a Column B value against the NORMALIZED reference handles"""
+        if handle_value is None:
+            return False
+        handle_str = str(handle_value).strip()
+        normalized = normalized_cache.get(handle_str)
+        if normalized is None:
+            normalized = normalize_handle(handle_str)
+            normalized_cache[handle_str] = normalized
+        return normalized in handles
+    
+    # Two-phase filter in one streaming pass: only Column B is decoded for
+    # every row - the full row is decoded only when its handle matches
+    rows = iter_rows(master_file, min_row=2, where=('B', is_matching_handle))
+    
+    stats['total_rows_processed'] = 0
+    stats['matching_rows'] = 0
+    
+    for row_data in rows:
+        stats['total_rows_processed'] += 1
         
-        handle_value = row[col_b_idx].value
+        if row_data is None:
+            continue  # Handle didn't match - row was never decoded
         
-        if handle_value is not None:
-            handle_str = str(handle_value).strip()
-            
-            # Normalize the handle from master file for comparison
-            normalized_handle = normalize_handle(handle_str)
-            
-            # Check if this NORMALIZED handle matches any from our reference file
-            if normalized_handle in handles:
-                # Extract all cell values from this row
-                row_data = [cell.value for cell in row]
-                
-                # CRITICAL: Replace Column B with the ORIGINAL reference handle
-                # This preserves special characters (™, ®, ©) from the reference file
-                original_handle = handle_mapping.get(normalized_handle, handle_str)
-                row_data[col_b_idx] = original_handle
-                
-                matching_rows.append(row_data)
-    
-    wb.close()
-    
-    print(f"✓ Processed {total_rows_processed} rows from master file")
-    print(f"✓ Found {len(matching_rows)} matching row(s)")
-    print(f"✓ Replaced handles with original reference handles (preserving special chars)")
+        # Normalized handle was cached by the filter check above
+        handle_str = str(row_data[col_b_idx]).strip()
+        normalized_handle = normalized_cache[handle_str]
+        
+        # CRITICAL: Replace Column B with the ORIGINAL reference handle
+        # This preserves special characters (™, ®, ©) from the reference file
+        original_handle = handle_mapping.get(normalized_handle, handle_str)
+        row_data[col_b_idx] = original_handle
+        
+        stats['matching_rows'] += 1
+        yield row_data
     
-    return matching_rows, header_row, total_rows_processed
+    print(f"✓ Processed {stats['total_rows_processed']} rows from master file")
+    print(f"✓ Found {stats['matching_rows']} matching row(s)")
+    print(f"✓ Replaced handles with original reference handles (preserving special chars)")
 
 
 def write_output_file(output_file, header_row, matching_rows):
     """
     Write the matching rows to output file
     
+    No file is created when there are no matching rows.
+    
     Args:
         output_file: Path to output .xlsx file
         header_row: List of header values
-        matching_rows: List of rows (each row is a list of cell values)
+        matching_rows: Iterable of rows (each row is a list of cell values)
+        
+    Returns:
+        Number of rows written (excluding the header)
     """
+    # Wait for the first matching row so no file is created when nothing matches
+    matching_rows = iter(matching_rows)
+    first_row = next(matching_rows, None)
+    if first_row is None:
+        return 0
+    
     print(f"\nWriting output file: {output_file}")
     
-    output_wb = Workbook()
-    output_ws = output_wb.active
+    # Write-only workbook: whole rows stream straight to the file
+    output_wb = Workbook(write_only=True)
+    output_ws = output_wb.create_sheet()
     
     # Write header row
-    for col_idx, header_value in enumerate(header_row, start=1):
-        output_ws.cell(row=1, column=col_idx, value=header_value)
+    output_ws.append(header_row)
     
     # Write all matching rows
-    for row_idx, row_data in enumerate(matching_rows, start=2):
-        for col_idx, cell_value in enumerate(row_data, start=1):
-            output_ws.cell(row=row_idx, column=col_idx, value=cell_value)
+    output_ws.append(first_row)
+    rows_written = 1
+    for row_data in matching_rows:
+        output_ws.append(row_data)
+        rows_written += 1
     
     # Save output file
     output_wb.save(output_file)
     output_wb.close()
     
     print(f"✓ Output file saved successfully")
+    
+    return rows_written
 
 
 def main():
@@ -220,8 +287,8 @@ def main():
     print("="*60)
     
     # Fixed file paths
-    reference_file = "data/all-socks-preupload-extracted-products.xlsx"
-    master_file = "raw/products-raw.xlsx"
+    reference_file = os.path.join(DATA_DIR, "all-socks-preupload-extracted-products.xlsx")
+    master_file = os.path.join(RAW_DIR, "products-raw.xlsx")
     
     print("\nThis script will extract products from the master file")
     print("based on handles found in the reference file.")
@@ -247,12 +314,8 @@ def main():
             print("\n⚠ Warning: No handles found in reference file")
             sys.exit(1)
         
-        # Step 2: Extract matching rows from master file
-        matching_rows, header_row, total_rows_processed = extract_matching_rows(master_file, handles, handle_mapping)
-        
-        if len(matching_rows) == 0:
-            print("\n⚠ Warning: No matching rows found in master file")
-            sys.exit(1)
+        # Step 2: Read the master file header
+        header_row = read_header_row(master_file)
         
         # Step 3: Create output filename
         # Extract base filename without extension
@@ -264,8 +327,14 @@ def main():
         else:
             output_file = f"{base_name}-extracted-products.xlsx"
         
-        # Step 4: Write output file
-        write_output_file(output_file, header_row, matching_rows)
+        # Step 4: Stream matching rows from master file into the output file
+        stats = {}
+        matching_rows = iter_matching_rows(master_file, handles, handle_mapping, stats)
+        rows_written = write_output_file(output_file, header_row, matching_rows)
+        
+        if rows_written == 0:
+            print("\n⚠ Warning: No matching rows found in master file")
+            sys.exit(1)
         
         # Print summary statistics
         print("\n" + "="*60)
@@ -273,8 +342,8 @@ def main():
         print("="*60)
         print(f"Reference file:       {reference_file}")
         print(f"Unique handles:       {len(handles)}")
-        print(f"Master rows checked:  {total_rows_processed}")
-        print(f"Matching rows found:  {len(matching_rows)}")
+        print(f"Master rows checked:  {stats['total_rows_processed']}")
+        print(f"Matching rows found:  {rows_written}")
         print(f"Output file:          {output_file}")
         print("="*60)
         print("\n✓ Processing complete!")
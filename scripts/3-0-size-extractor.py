@@ -4,9 +4,28 @@ Extracts unique size tags from Column H of an Excel file
 and outputs them to a sorted, deduplicated text file
 """
 
-from openpyxl import load_workbook
+from xlsx_stream import iter_rows
 import sys
 import os
+import re
+
+# A comma-separated tag starting with 'size_', captured without surrounding whitespace
+SIZE_TAG_PATTERN = re.compile(r'(?:^|,)\s*(size_[^,]*?)\s*(?=,|$)')
+DIGIT_RUNS = re.compile(r'(\d+)')
+
+def natural_sort_key(tag):
+    """
+    Sort key that compares digit runs as numbers (size_2 before size_10)
+    
+    Args:
+        tag: Size tag string
+        
+    Returns:
+        List alternating text parts and integers
+    """
+    parts = DIGIT_RUNS.split(tag)
+    parts[1::2] = map(int, parts[1::2])  # Odd positions are the digit runs
+    return parts
 
 def extract_size_tags(file_path):
     """
@@ -16,54 +35,48 @@ def extract_size_tags(file_path):
         file_path: Path to the .xlsx file to analyze
         
     Returns:
-        Sorted list of unique size tags
+        Naturally sorted list of unique size tags
     """
     print(f"\nLoading file: {file_path}")
-    wb = load_workbook(file_path, read_only=True, data_only=True)
-    ws = wb.active
-    
-    col_h = 8  # Column H
+    # Stream only Column H straight from the sheet XML
+    rows = iter_rows(file_path, columns=('H',))
     
     # Verify header
-    header_h = ws.cell(row=1, column=col_h).value
+    header_h = next(rows, [None])[0]
     print(f"Column H header: [{header_h}]")
     
     size_tags = set()  # Use set for automatic deduplication
     total_rows_processed = 0
     rows_with_size_tags = 0
     
-    # Iterate through all rows (starting from row 2 to skip header)
+    # Iterate through all remaining rows (header already consumed)
     print(f"\nProcessing rows...")
-    for row in ws.iter_rows(min_row=2):
+    for row in rows:
         total_rows_processed += 1
         
-        # Get value from Column H (0-based index)
-        cell_value = row[col_h - 1].value
+        # Get value from Column H (only column requested)
+        cell_value = row[0]
         
         if cell_value is not None:
-            # Convert to string and split by comma
+            # Convert to string
             tags_string = str(cell_value).strip()
             
             if tags_string:
-                # Split by comma and process each tag
-                tags = [tag.strip() for tag in tags_string.split(',')]
-                
-                # Extract only tags that start with 'size_'
-                size_tags_in_row = [tag for tag in tags if tag.startswith('size_')]
+                # Extract only tags that start with 'size_' (one regex pass
+                # instead of split + strip + startswith per tag)
+                size_tags_in_row = SIZE_TAG_PATTERN.findall(tags_string)
                 
                 if size_tags_in_row:
                     rows_with_size_tags += 1
                     # Add to our set (automatically deduplicates)
                     size_tags.update(size_tags_in_row)
     
-    wb.close()
-    
     print(f"✓ Processed {total_rows_processed} rows")
     print(f"✓ Found size tags in {rows_with_size_tags} rows")
     print(f"✓ Extracted {len(size_tags)} unique size tag(s)")
     
-    # Convert set to sorted list
-    sorted_size_tags = sorted(size_tags)
+    # Convert set to sorted list (numeric parts in numeric order)
+    sorted_size_tags = sorted(size_tags, key=natural_sort_key)
     
     return sorted_size_tags
 
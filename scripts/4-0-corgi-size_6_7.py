@@ -19,21 +19,41 @@ Features:
 """
 
 import openpyxl
+from openpyxl.utils import get_column_letter
+from xlsx_stream import iter_rows, sheet_max_row
 import json
+import os
+import re
+import sys
+from functools import lru_cache
 from pathlib import Path
 
 
-def parse_comma_separated_tags(cell_value):
+# Project folders - defaults to the repo root, override with the ROBINSONS_ROOT environment variable
+ROOT = Path(os.environ.get("ROBINSONS_ROOT", Path(__file__).resolve().parent.parent))
+DATA_DIR = ROOT / "data"
+
+
+# Matrixify header of the gender metafield column (Column CQ in the current export)
+GENDER_HEADER = "Metafield: custom.gender [list.single_line_text_field]"
+
+
+@lru_cache(maxsize=None)
+def _parse_json_text(text):
     """
-    Parse a cell value containing comma-separated tags.
-    Returns a list of stripped tag values.
+    Parse gender cell text once per distinct value - the column only ever
+    holds a handful of different lists, so repeats come from the cache.
+    Returns a tuple so the cached value can't be mutated by callers.
     """
-    if cell_value is None or cell_value == "":
-        return []
-    
-    # Split by comma and strip whitespace
-    tags = [tag.strip() for tag in str(cell_value).split(',')]
-    return [tag for tag in tags if tag]  # Remove empty strings
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, list):
+            return tuple(parsed)
+        else:
+            return (parsed,)
+    except json.JSONDecodeError:
+        # If not valid JSON, treat as plain string
+        return (text,)
 
 
 def parse_json_list(cell_value):
@@ -48,16 +68,11 @@ def parse_json_list(cell_value):
     if isinstance(cell_value, list):
         return cell_value
     
-    # Try to parse as JSON
-    try:
-        parsed = json.loads(cell_value)
-        if isinstance(parsed, list):
-            return parsed
-        else:
-            return [parsed]
-    except (json.JSONDecodeError, TypeError):
-        # If not valid JSON, treat as plain string
+    # Non-text values (numbers, dates) can't be JSON - treat as plain string
+    if not isinstance(cell_value, str):
         return [str(cell_value)]
+    
+    return list(_parse_json_text(cell_value))
 
 
 def format_json_list(values):
@@ -119,10 +134,8 @@ def update_gender_tags():
     """
     Main function to update gender tags in the products file.
     """
-    # File paths - relative to script location
-    script_dir = Path(__file__).parent
-    project_root = script_dir.parent
-    input_file = project_root / "data" / "all-socks-preupload-extracted-products.xlsx"
+    # File paths - relative to the project root
+    input_file = DATA_DIR / "all-socks-preupload-extracted-products.xlsx"
     
     # Check if file exists
     if not input_file.exists():
@@ -144,9 +157,16 @@ def update_gender_tags():
         print("\nError: All fields are required!")
         return
     
+    # Column H tags are comma-separated, so a label containing a comma can never be one tag
+    if ',' in size_label:
+        print("\nError: Size Label must be a single tag (no commas)!")
+        return
+    
+    # Size label must appear as one whole comma-separated tag (surrounding whitespace ignored)
+    size_pattern = re.compile(r'(?:^|,)\s*' + re.escape(size_label) + r'\s*(?:,|$)')
+    
     # Generate output filename
-    output_dir = project_root / "data"
-    output_file = output_dir / f"products-updated-{brand_name.lower()}-{size_label.replace('/', '-')}.xlsx"
+    output_file = DATA_DIR / f"products-updated-{brand_name.lower()}-{size_label.replace('/', '-')}.xlsx"
     
     print(f"\nSearching for:")
     print(f"  Brand: '{brand_name}'")
@@ -156,103 +176,96 @@ def update_gender_tags():
     print(f"Output file: {output_file.name}")
     print("\nLoading workbook...")
     
-    # Load the input workbook
-    wb_input = openpyxl.load_workbook(input_file)
-    ws_input = wb_input.active
+    # Read the header row and make sure the gender column is present
+    header_row = next(iter_rows(input_file, max_row=1), [])
+    if GENDER_HEADER not in header_row:
+        print(f"\nError: Gender column '{GENDER_HEADER}' not found in {input_file.name}")
+        return
     
     # Create new workbook for output (only matched rows)
-    wb_output = openpyxl.Workbook()
-    ws_output = wb_output.active
+    # Write-only mode streams appended rows to disk instead of building every cell in memory
+    wb_output = openpyxl.Workbook(write_only=True)
+    ws_output = wb_output.create_sheet()
     
     # Copy header row to output
-    header_row = list(ws_input[1])
-    for col_idx, cell in enumerate(header_row, start=1):
-        ws_output.cell(row=1, column=col_idx, value=cell.value)
+    ws_output.append(header_row)
     
     # Column indices (1-based for openpyxl)
     HANDLE_COL = 2  # Column B
     BRAND_COL = 6  # Column F
     SIZE_COL = 8   # Column H
-    GENDER_COL = 95  # Column CQ (C=3, Q=17 -> 3*26+17 = 95)
+    GENDER_COL = header_row.index(GENDER_HEADER) + 1  # Looked up by header name
     
     # Track statistics
     rows_processed = 0
     rows_matched = 0
     rows_updated = 0
     rows_unchanged = 0
-    output_row = 2  # Start at row 2 (after header)
     
     # Track unique handles (for Shopify Matrixify format)
     seen_handles = set()  # Track which handles we've already output
     
     # Get total rows
-    total_rows = ws_input.max_row
+    # (None for files saved in write-only mode - progress is then shown without a total)
+    total_rows = sheet_max_row(input_file)
+    data_rows = f"/{total_rows - 1}" if total_rows else ""
     
-    print(f"Processing {total_rows} rows...")
+    if total_rows:
+        print(f"Processing {total_rows} rows...")
+    else:
+        print("Processing rows...")
     print()
     
-    # Iterate through rows (skip header row)
-    for row_num in range(2, total_rows + 1):
+    # Stream the data rows straight from the sheet XML (the file is never modified)
+    # Only the brand cell is decoded for other brands - those rows come back as None
+    def is_brand(value):
+        """Check a Column F value against the brand being updated"""
+        return value == brand_name
+    
+    rows = iter_rows(input_file, min_row=2, where=(get_column_letter(BRAND_COL), is_brand))
+    
+    for row in rows:
         rows_processed += 1
         
-        # Show progress every 1000 rows
-        if rows_processed % 1000 == 0:
-            print(f"  Processed {rows_processed}/{total_rows - 1} rows... (Matched: {rows_matched}, Updated: {rows_updated})")
+        # Show progress every 1024 rows, rewriting one console line (bitmask instead of modulo)
+        if rows_processed & 0x3FF == 0:
+            sys.stdout.write(f"\r  Processed {rows_processed}{data_rows} rows... (Matched: {rows_matched}, Updated: {rows_updated})")
+            sys.stdout.flush()
         
-        # Get handle, brand, size, and gender cells from input
-        handle_cell = ws_input.cell(row=row_num, column=HANDLE_COL)
-        brand_cell = ws_input.cell(row=row_num, column=BRAND_COL)
-        size_cell = ws_input.cell(row=row_num, column=SIZE_COL)
-        gender_cell = ws_input.cell(row=row_num, column=GENDER_COL)
+        # Brand is the most selective check - other brands were rejected by the reader
+        if row is None:
+            continue
         
-        handle_value = handle_cell.value
-        brand_value = brand_cell.value
-        size_tags = parse_comma_separated_tags(size_cell.value)
+        # Size label must be one of the comma-separated tags (exact case)
+        size_value = row[SIZE_COL - 1]
+        if size_value is None or not size_pattern.search(str(size_value)):
+            continue
         
-        # Check if both criteria match (exact case)
-        # Brand must match exactly, and size_label must be in the comma-separated tags
-        if brand_value == brand_name and size_label in size_tags:
-            rows_matched += 1
-            
-            # Check if this is the first occurrence of this handle
-            is_first_occurrence = handle_value not in seen_handles
-            
-            # Parse existing gender values (only if first occurrence)
-            if is_first_occurrence:
-                current_genders = parse_json_list(gender_cell.value)
-                
-                # Update gender list according to business rules
-                updated_genders, was_changed = update_gender_list(current_genders, gender)
-                
-                if was_changed:
-                    rows_updated += 1
-                else:
-                    rows_unchanged += 1
-                
-                # Mark this handle as seen
-                seen_handles.add(handle_value)
-            else:
-                # Subsequent occurrence - no gender update needed
-                updated_genders = None
-            
-            # Copy entire row to output workbook
-            for col_idx in range(1, ws_input.max_column + 1):
-                source_cell = ws_input.cell(row=row_num, column=col_idx)
-                target_cell = ws_output.cell(row=output_row, column=col_idx)
-                
-                # Copy value (update gender if this column is the gender column AND it's first occurrence)
-                if col_idx == GENDER_COL:
-                    if is_first_occurrence:
-                        target_cell.value = format_json_list(updated_genders)
-                    else:
-                        target_cell.value = None  # Leave blank for subsequent variants
-                else:
-                    target_cell.value = source_cell.value
-            
-            output_row += 1
-    
-    # Close input workbook (we don't modify it)
-    wb_input.close()
+        rows_matched += 1
+        handle_value = row[HANDLE_COL - 1]
+        
+        # Subsequent occurrences of a handle don't need their gender parsed at all
+        if handle_value in seen_handles:
+            row[GENDER_COL - 1] = None  # Leave blank for subsequent variants
+            ws_output.append(row)
+            continue
+        
+        # First occurrence - update gender list according to business rules
+        current_genders = parse_json_list(row[GENDER_COL - 1])
+        updated_genders, was_changed = update_gender_list(current_genders, gender)
+        
+        if was_changed:
+            rows_updated += 1
+        else:
+            rows_unchanged += 1
+        
+        # Mark this handle as seen
+        seen_handles.add(handle_value)
+        
+        # Copy entire row to output workbook, patching only the gender column
+        # (the reader yields a fresh list per row, so it can be updated in place)
+        row[GENDER_COL - 1] = format_json_list(updated_genders)
+        ws_output.append(row)
     
     # Save the output workbook (only matched rows)
     print()
@@ -22,9 +22,15 @@ Usage:
 
 import openpyxl
 import json
+import os
 from pathlib import Path
 
 
+# Project folders - defaults to the repo root, override with the ROBINSONS_ROOT environment variable
+ROOT = Path(os.environ.get("ROBINSONS_ROOT", Path(__file__).resolve().parent.parent))
+DATA_DIR = ROOT / "data"
+
+
 def parse_comma_separated_tags(cell_value):
     """
     Parse a cell value containing comma-separated tags.
@@ -153,7 +159,7 @@ def update_gender_tags():
         return
     
     # Generate output filename
-    output_dir = Path(r"C:\Users\New\Documents\Work\Client\Robinson\phase-2\data")
+    output_dir = DATA_DIR
     output_file = output_dir / f"products-updated-happy-socks-{size_label.replace('/', '-')}.xlsx"
     
     print(f"\nSearching for:")
@@ -193,8 +199,9 @@ def update_gender_tags():
     # Track unique handles (for Shopify Matrixify format)
     seen_handles = set()  # Track which handles we've already output
     
-    # Get total rows
+    # Get sheet bounds once (used by the per-row copy loop below)
     total_rows = ws_input.max_row
+    max_col = ws_input.max_column
     
     print(f"Processing {total_rows} rows...")
     print()
@@ -244,7 +251,7 @@ def update_gender_tags():
                 updated_genders = None
             
             # Copy entire row to output workbook
-            for col_idx in range(1, ws_input.max_column + 1):
+            for col_idx in range(1, max_col + 1):
                 source_cell = ws_input.cell(row=row_num, column=col_idx)
                 target_cell = ws_output.cell(row=output_row, column=col_idx)
                 
@@ -17,21 +17,40 @@ Features:
 """
 
 import openpyxl
+from openpyxl.utils import get_column_letter
+from xlsx_stream import iter_rows, sheet_max_row
 import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 
-def parse_comma_separated_tags(cell_value):
+# Project folders - defaults to the repo root, override with the ROBINSONS_ROOT environment variable
+ROOT = Path(os.environ.get("ROBINSONS_ROOT", Path(__file__).resolve().parent.parent))
+DATA_DIR = ROOT / "data"
+
+
+# Matrixify header of the gender metafield column (Column CQ in the current export)
+GENDER_HEADER = "Metafield: custom.gender [list.single_line_text_field]"
+
+
+def size_matches(cell_value, target):
     """
-    Parse a cell value containing comma-separated tags.
-    Returns a list of stripped tag values.
+    Check if a cell of comma-separated tags contains target as one of its tags.
+    Tags are compared exactly after stripping surrounding whitespace.
     """
-    if cell_value is None or cell_value == "":
-        return []
+    if cell_value is None or not target:
+        return False
+    
+    tags_string = str(cell_value)
     
-    # Split by comma and strip whitespace
-    tags = [tag.strip() for tag in str(cell_value).split(',')]
-    return [tag for tag in tags if tag]  # Remove empty strings
+    # Fast path: most rows don't contain the target text at all
+    if target not in tags_string:
+        return False
+    
+    # Exact check - rules out partial matches like "size_6_7" inside "size_6_7_8"
+    return any(tag.strip() == target for tag in tags_string.split(','))
 
 
 def format_json_list(values):
@@ -41,29 +60,39 @@ def format_json_list(values):
     return json.dumps(values)
 
 
-def categorize_product(size_tags):
+# Gender tags applied to each category
+CATEGORY_GENDERS = {
+    "female_only": ["Female"],
+    "male_only": ["Male"],
+    "unisex": ["Female", "Male", "Unisex"]
+}
+
+# Gender column value for each category - there are only three, so serialize them once
+GENDER_JSON = {category: format_json_list(genders) for category, genders in CATEGORY_GENDERS.items()}
+
+
+def categorize_product(size_value):
     """
-    Categorize a product based on which sizes it has.
+    Categorize a product based on which sizes its Column H tags include.
     
-    Returns: tuple (category, gender_list)
-    - category: "female_only", "male_only", or "unisex"
-    - gender_list: list of gender strings to apply
+    Returns: category - "female_only", "male_only", "unisex", or None to skip
+    (see CATEGORY_GENDERS for the gender tags each category gets)
     """
-    has_36_40 = "size_36_40" in size_tags
-    has_41_46 = "size_41_46" in size_tags
+    has_36_40 = size_matches(size_value, "size_36_40")
+    has_41_46 = size_matches(size_value, "size_41_46")
     
     if has_36_40 and has_41_46:
         # Has BOTH sizes → Unisex
-        return "unisex", ["Female", "Male", "Unisex"]
+        return "unisex"
     elif has_36_40:
         # Has ONLY size_36_40 → Female
-        return "female_only", ["Female"]
+        return "female_only"
     elif has_41_46:
         # Has ONLY size_41_46 → Male
-        return "male_only", ["Male"]
+        return "male_only"
     else:
         # Has neither size → skip
-        return None, []
+        return None
 
 
 def split_happy_socks():
@@ -79,9 +108,9 @@ def split_happy_socks():
     print("  3. Unisex (both sizes)")
     print()
     
-    # Fixed paths
-    input_file = Path(r"C:\Users\New\Documents\Work\Client\Robinson\phase-2\data\all-socks-preupload-extracted-products.xlsx")
-    output_dir = Path(r"C:\Users\New\Documents\Work\Client\Robinson\phase-2\data")
+    # Fixed paths (relative to the project root)
+    input_file = DATA_DIR / "all-socks-preupload-extracted-products.xlsx"
+    output_dir = DATA_DIR
     
     # Check if input file exists
     if not input_file.exists():
@@ -102,31 +131,30 @@ def split_happy_socks():
     print(f"  Unisex: {output_files['unisex'].name}")
     print("\nLoading workbook...")
     
-    # Load the input workbook
-    wb_input = openpyxl.load_workbook(input_file)
-    ws_input = wb_input.active
+    # Read the header row and make sure the gender column is present
+    header_row = next(iter_rows(input_file, max_row=1), [])
+    if GENDER_HEADER not in header_row:
+        print(f"\nError: Gender column '{GENDER_HEADER}' not found in {input_file.name}")
+        return
     
     # Create output workbooks
+    # Write-only mode streams appended rows to disk instead of building every cell in memory
     wb_outputs = {
-        "female_only": openpyxl.Workbook(),
-        "male_only": openpyxl.Workbook(),
-        "unisex": openpyxl.Workbook()
+        "female_only": openpyxl.Workbook(write_only=True),
+        "male_only": openpyxl.Workbook(write_only=True),
+        "unisex": openpyxl.Workbook(write_only=True)
     }
+    ws_outputs = {category: wb.create_sheet() for category, wb in wb_outputs.items()}
     
-    # Get header row from input
-    header_row = list(ws_input[1])
-    
-    # Copy header row to all output workbooks and initialize
-    for category, wb in wb_outputs.items():
-        ws = wb.active
-        for col_idx, cell in enumerate(header_row, start=1):
-            ws.cell(row=1, column=col_idx, value=cell.value)
+    # Copy header row to all output workbooks
+    for ws in ws_outputs.values():
+        ws.append(header_row)
     
     # Column indices (1-based for openpyxl)
     HANDLE_COL = 2   # Column B
     BRAND_COL = 6    # Column F
     SIZE_COL = 8     # Column H
-    GENDER_COL = 95  # Column CQ
+    GENDER_COL = header_row.index(GENDER_HEADER) + 1  # Looked up by header name
     
     # Track statistics
     rows_processed = 0
@@ -153,36 +181,44 @@ def split_happy_socks():
     }
     
     # Get total rows
-    total_rows = ws_input.max_row
+    # (None for files saved in write-only mode - progress is then shown without a total)
+    total_rows = sheet_max_row(input_file)
+    data_rows = f"/{total_rows - 1}" if total_rows else ""
     
-    print(f"Processing {total_rows} rows...")
+    if total_rows:
+        print(f"Processing {total_rows} rows...")
+    else:
+        print("Processing rows...")
     print()
     
-    # Iterate through rows (skip header row)
-    for row_num in range(2, total_rows + 1):
+    # Stream the data rows straight from the sheet XML (the file is never modified)
+    # Only the brand cell is decoded for other brands - those rows come back as None
+    def is_happy_socks(value):
+        """Check a Column F value against the fixed Happy Socks brand"""
+        return value == "Happy Socks"
+    
+    rows = iter_rows(input_file, min_row=2, where=(get_column_letter(BRAND_COL), is_happy_socks))
+    
+    for row in rows:
         rows_processed += 1
         
-        # Show progress every 500 rows
-        if rows_processed % 500 == 0:
-            print(f"  Processed {rows_processed}/{total_rows - 1} rows... (Happy Socks: {happy_socks_found})")
-        
-        # Get cells from input
-        handle_cell = ws_input.cell(row=row_num, column=HANDLE_COL)
-        brand_cell = ws_input.cell(row=row_num, column=BRAND_COL)
-        size_cell = ws_input.cell(row=row_num, column=SIZE_COL)
+        # Show progress every 512 rows, rewriting one console line (bitmask instead of modulo)
+        if rows_processed & 0x1FF == 0:
+            sys.stdout.write(f"\r  Processed {rows_processed}{data_rows} rows... (Happy Socks: {happy_socks_found})")
+            sys.stdout.flush()
         
-        handle_value = handle_cell.value
-        brand_value = brand_cell.value
-        size_tags = parse_comma_separated_tags(size_cell.value)
-        
-        # Only process Happy Socks products
-        if brand_value != "Happy Socks":
+        # Only process Happy Socks products (other brands were rejected by the reader)
+        if row is None:
             continue
         
+        # Get values from input (0-based list indexes)
+        handle_value = row[HANDLE_COL - 1]
+        size_value = row[SIZE_COL - 1]
+        
         happy_socks_found += 1
         
         # Categorize the product
-        category, gender_list = categorize_product(size_tags)
+        category = categorize_product(size_value)
         
         if category is None:
             # Happy Socks but doesn't have the sizes we care about
@@ -196,35 +232,28 @@ def split_happy_socks():
             seen_handles[category].add(handle_value)
             categorized[category] += 1
         
-        # Get the output workbook and row number for this category
-        ws_output = wb_outputs[category].active
-        output_row = output_rows[category]
+        # Copy entire row to the output workbook for this category, patching only the gender column
+        # (the reader yields a fresh list per row, so it can be updated in place)
+        if is_first_occurrence:
+            row[GENDER_COL - 1] = GENDER_JSON[category]
+        else:
+            row[GENDER_COL - 1] = None  # Leave blank for subsequent variants
         
-        # Copy entire row to output workbook
-        for col_idx in range(1, ws_input.max_column + 1):
-            source_cell = ws_input.cell(row=row_num, column=col_idx)
-            target_cell = ws_output.cell(row=output_row, column=col_idx)
-            
-            # Copy value (update gender if this is the gender column AND first occurrence)
-            if col_idx == GENDER_COL:
-                if is_first_occurrence:
-                    target_cell.value = format_json_list(gender_list)
-                else:
-                    target_cell.value = None  # Leave blank for subsequent variants
-            else:
-                target_cell.value = source_cell.value
+        ws_outputs[category].append(row)
         
         # Increment output row for this category
         output_rows[category] += 1
     
-    # Close input workbook
-    wb_input.close()
-    
-    # Save all output workbooks
+    # Save all output workbooks (independent files, so they are written concurrently)
     print()
     print("Saving workbooks...")
-    for category, wb in wb_outputs.items():
-        wb.save(output_files[category])
+    with ThreadPoolExecutor(max_workers=len(wb_outputs)) as executor:
+        saves = {
+            category: executor.submit(wb.save, output_files[category])
+            for category, wb in wb_outputs.items()
+        }
+    for category, save in saves.items():
+        save.result()  # Re-raise any error from that save
         print(f"  Saved {output_files[category].name}")
     
     # Print summary
@@ -239,17 +268,17 @@ def split_happy_socks():
     print(f"  Female-only (size_36_40 only):")
     print(f"    - Unique products: {len(seen_handles['female_only'])}")
     print(f"    - Total rows: {output_rows['female_only'] - 2}")
-    print(f"    - Gender tags: ['Female']")
+    print(f"    - Gender tags: {CATEGORY_GENDERS['female_only']}")
     print()
     print(f"  Male-only (size_41_46 only):")
     print(f"    - Unique products: {len(seen_handles['male_only'])}")
     print(f"    - Total rows: {output_rows['male_only'] - 2}")
-    print(f"    - Gender tags: ['Male']")
+    print(f"    - Gender tags: {CATEGORY_GENDERS['male_only']}")
     print()
     print(f"  Unisex (both sizes):")
     print(f"    - Unique products: {len(seen_handles['unisex'])}")
     print(f"    - Total rows: {output_rows['unisex'] - 2}")
-    print(f"    - Gender tags: ['Female', 'Male', 'Unisex']")
+    print(f"    - Gender tags: {CATEGORY_GENDERS['unisex']}")
     print()
     print(f"  Skipped (no relevant sizes): {categorized['skipped']}")
     print()
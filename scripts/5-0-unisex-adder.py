@@ -22,10 +22,41 @@ Logic:
 """
 
 import openpyxl
+from xlsx_stream import iter_rows, sheet_max_row
 import json
+import os
+import sys
+from functools import lru_cache
 from pathlib import Path
 
 
+# Project folders - defaults to the repo root, override with the ROBINSONS_ROOT environment variable
+ROOT = Path(os.environ.get("ROBINSONS_ROOT", Path(__file__).resolve().parent.parent))
+DATA_DIR = ROOT / "data"
+
+
+# Matrixify header of the gender metafield column (Column CQ in the current export)
+GENDER_HEADER = "Metafield: custom.gender [list.single_line_text_field]"
+
+
+@lru_cache(maxsize=None)
+def _parse_json_text(text):
+    """
+    Parse gender cell text once per distinct value - the column only ever
+    holds a handful of different lists, so repeats come from the cache.
+    Returns a tuple so the cached value can't be mutated by callers.
+    """
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, list):
+            return tuple(parsed)
+        else:
+            return (parsed,)
+    except json.JSONDecodeError:
+        # If not valid JSON, treat as plain string
+        return (text,)
+
+
 def parse_json_list(cell_value):
     """
     Parse a cell value that might be a JSON list string.
@@ -38,16 +69,11 @@ def parse_json_list(cell_value):
     if isinstance(cell_value, list):
         return cell_value
     
-    # Try to parse as JSON
-    try:
-        parsed = json.loads(cell_value)
-        if isinstance(parsed, list):
-            return parsed
-        else:
-            return [parsed]
-    except (json.JSONDecodeError, TypeError):
-        # If not valid JSON, treat as plain string
+    # Non-text values (numbers, dates) can't be JSON - treat as plain string
+    if not isinstance(cell_value, str):
         return [str(cell_value)]
+    
+    return list(_parse_json_text(cell_value))
 
 
 def format_json_list(values):
@@ -57,6 +83,10 @@ def format_json_list(values):
     return json.dumps(values)
 
 
+# One bit per gender so a whole list can be checked with a single comparison
+GENDER_BITS = {"male": 1, "female": 2, "unisex": 4}
+
+
 def should_add_unisex(genders):
     """
     Check if "Unisex" should be added to the gender list.
@@ -74,13 +104,13 @@ def should_add_unisex(genders):
     if not genders or len(genders) < 2:
         return False
     
-    # Check if both Male and Female exist (case-insensitive)
-    has_male = any(g.lower() == "male" for g in genders)
-    has_female = any(g.lower() == "female" for g in genders)
-    has_unisex = any(g.lower() == "unisex" for g in genders)
+    # Fold the list into a bitmask in one pass (case-insensitive)
+    mask = 0
+    for g in genders:
+        mask |= GENDER_BITS.get(g.lower(), 0)
     
     # Add Unisex if we have both Male and Female but not Unisex yet
-    return has_male and has_female and not has_unisex
+    return mask == GENDER_BITS["male"] | GENDER_BITS["female"]
 
 
 def add_unisex_tags():
@@ -112,7 +142,7 @@ def add_unisex_tags():
         return
     
     # Generate output filename
-    output_dir = Path(r"C:\Users\New\Documents\Work\Client\Robinson\phase-2\data")
+    output_dir = DATA_DIR
     input_basename = input_file.stem  # filename without extension
     output_file = output_dir / f"{input_basename}-with-unisex.xlsx"
     
@@ -120,58 +150,64 @@ def add_unisex_tags():
     print(f"Output file: {output_file.name}")
     print("\nLoading workbook...")
     
-    # Load the input workbook
-    wb_input = openpyxl.load_workbook(input_file)
-    ws_input = wb_input.active
+    # Stream the input rows straight from the sheet XML (the file is never modified)
+    rows = iter_rows(input_file)
+    
+    # Read the header row and make sure the gender column is present
+    header_row = next(rows, [])
+    if GENDER_HEADER not in header_row:
+        print(f"\nError: Gender column '{GENDER_HEADER}' not found in {input_file.name}")
+        return
     
     # Create new workbook for output
-    wb_output = openpyxl.Workbook()
-    ws_output = wb_output.active
+    # Write-only mode streams appended rows to disk instead of building every cell in memory
+    wb_output = openpyxl.Workbook(write_only=True)
+    ws_output = wb_output.create_sheet()
     
     # Copy header row to output
-    header_row = list(ws_input[1])
-    for col_idx, cell in enumerate(header_row, start=1):
-        ws_output.cell(row=1, column=col_idx, value=cell.value)
+    ws_output.append(header_row)
     
     # Column indices (1-based for openpyxl)
     HANDLE_COL = 2   # Column B
-    GENDER_COL = 95  # Column CQ (C=3, Q=17 -> 3*26+17 = 95)
+    GENDER_COL = header_row.index(GENDER_HEADER) + 1  # Looked up by header name
     
     # Track statistics
     rows_processed = 0
     rows_with_unisex_added = 0
     rows_unchanged = 0
-    output_row = 2  # Start at row 2 (after header)
     
     # Track unique handles (for Shopify Matrixify format)
     seen_handles = set()  # Track which handles we've already processed
     
     # Get total rows
-    total_rows = ws_input.max_row
+    # (None for files saved in write-only mode - progress is then shown without a total)
+    total_rows = sheet_max_row(input_file)
+    data_rows = f"/{total_rows - 1}" if total_rows else ""
     
-    print(f"Processing {total_rows} rows...")
+    if total_rows:
+        print(f"Processing {total_rows} rows...")
+    else:
+        print("Processing rows...")
     print()
     
-    # Iterate through rows (skip header row)
-    for row_num in range(2, total_rows + 1):
+    # Iterate through the remaining rows (header already consumed)
+    for row in rows:
         rows_processed += 1
         
-        # Show progress every 1000 rows
-        if rows_processed % 1000 == 0:
-            print(f"  Processed {rows_processed}/{total_rows - 1} rows... (Unisex added: {rows_with_unisex_added})")
-        
-        # Get handle and gender cells from input
-        handle_cell = ws_input.cell(row=row_num, column=HANDLE_COL)
-        gender_cell = ws_input.cell(row=row_num, column=GENDER_COL)
+        # Show progress every 1024 rows, rewriting one console line (bitmask instead of modulo)
+        if rows_processed & 0x3FF == 0:
+            sys.stdout.write(f"\r  Processed {rows_processed}{data_rows} rows... (Unisex added: {rows_with_unisex_added})")
+            sys.stdout.flush()
         
-        handle_value = handle_cell.value
+        # Get handle value from input (0-based tuple index)
+        handle_value = row[HANDLE_COL - 1]
         
         # Check if this is the first occurrence of this handle
         is_first_occurrence = handle_value not in seen_handles
         
         # Process gender (only if first occurrence)
         if is_first_occurrence:
-            current_genders = parse_json_list(gender_cell.value)
+            current_genders = parse_json_list(row[GENDER_COL - 1])
             
             # Check if we should add Unisex
             if should_add_unisex(current_genders):
@@ -187,24 +223,14 @@ def add_unisex_tags():
             # Subsequent occurrence - no gender update needed
             updated_genders = None
         
-        # Copy entire row to output workbook
-        for col_idx in range(1, ws_input.max_column + 1):
-            source_cell = ws_input.cell(row=row_num, column=col_idx)
-            target_cell = ws_output.cell(row=output_row, column=col_idx)
-            
-            # Copy value (update gender if this column is the gender column AND it's first occurrence)
-            if col_idx == GENDER_COL:
-                if is_first_occurrence and updated_genders is not None:
-                    target_cell.value = format_json_list(updated_genders) if updated_genders else None
-                else:
-                    target_cell.value = None  # Leave blank for subsequent variants
-            else:
-                target_cell.value = source_cell.value
+        # Copy entire row to output workbook, patching only the gender column
+        # (the reader yields a fresh list per row, so it can be updated in place)
+        if is_first_occurrence and updated_genders is not None:
+            row[GENDER_COL - 1] = format_json_list(updated_genders) if updated_genders else None
+        else:
+            row[GENDER_COL - 1] = None  # Leave blank for subsequent variants
         
-        output_row += 1
-    
-    # Close input workbook
-    wb_input.close()
+        ws_output.append(row)
     
     # Save the output workbook
     print()
@@ -0,0 +1,300 @@
+"""
+XLSX Stream Reader
+Streams cell values straight from the worksheet XML inside an .xlsx file
+without building openpyxl Cell objects, so large sheets can be scanned quickly
+
+Only the columns that are asked for are decoded - every other cell is skipped
+without being materialized. Values are converted the same way openpyxl does
+(shared strings, inline strings, booleans, numbers and date-formatted numbers)
+"""
+
+from functools import lru_cache
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import from_excel, from_ISO8601, MAC_EPOCH, WINDOWS_EPOCH
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+DIMENSION_TAG = f'{MAIN_NS}dimension'
+SHEET_DATA_TAG = f'{MAIN_NS}sheetData'
+ROW_TAG = f'{MAIN_NS}row'
+VALUE_TAG = f'{MAIN_NS}v'
+INLINE_TAG = f'{MAIN_NS}is'
+TEXT_TAG = f'{MAIN_NS}t'
+RICH_TEXT_PATH = f'{MAIN_NS}r/{MAIN_NS}t'
+
+DIGITS = '0123456789'
+
+
+@lru_cache(maxsize=None)
+def column_index(letters):
+    """
+    Convert a column letter reference to a 1-based column index
+
+    Args:
+        letters: Column letters (e.g. 'B', 'CQ')
+
+    Returns:
+        1-based column index (e.g. 2, 95)
+    """
+    index = 0
+    for char in letters.upper():
+        index = index * 26 + ord(char) - 64
+    return index
+
+
+def _read_text(element):
+    """
+    Join the text of a shared/inline string element (plain or rich text runs)
+    Phonetic runs are ignored, matching openpyxl
+    """
+    text = element.find(TEXT_TAG)
+    if text is not None:
+        return text.text or ''
+    return ''.join(run.text or '' for run in element.iterfind(RICH_TEXT_PATH))
+
+
+def _workbook_parts(archive):
+    """
+    Locate the active sheet and the shared strings / styles parts
+
+    Returns:
+        Tuple of (sheet_path, shared_strings_path, styles_path, epoch)
+    """
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+
+    # Active sheet index (same sheet openpyxl returns for wb.active)
+    view = workbook.find(f'{MAIN_NS}bookViews/{MAIN_NS}workbookView')
+    active_tab = int(view.get('activeTab', 0)) if view is not None else 0
+    sheets = workbook.findall(f'{MAIN_NS}sheets/{MAIN_NS}sheet')
+    sheet_rel_id = sheets[active_tab].get(f'{REL_NS}id')
+
+    properties = workbook.find(f'{MAIN_NS}workbookPr')
+    date1904 = properties is not None and properties.get('date1904') in ('1', 'true')
+    epoch = MAC_EPOCH if date1904 else WINDOWS_EPOCH
+
+    # Resolve relationship targets (relative to xl/ unless absolute)
+    targets = {}
+    rel_types = {}
+    rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels:
+        target = rel.get('Target')
+        if target.startswith('/'):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join('xl', target))
+        targets[rel.get('Id')] = target
+        rel_types[rel.get('Type').rsplit('/', 1)[-1]] = target
+
+    return targets[sheet_rel_id], rel_types.get('sharedStrings'), rel_types.get('styles'), epoch
+
+
+def _read_shared_strings(archive, path):
+    """
+    Load the shared string table once as a list (index → string)
+    """
+    strings = []
+    if path is None or path not in archive.namelist():
+        return strings
+
+    si_tag = f'{MAIN_NS}si'
+    with archive.open(path) as source:
+        for _, element in ET.iterparse(source, events=('end',)):
+            if element.tag == si_tag:
+                strings.append(_read_text(element).replace('x005F_', ''))
+                element.clear()
+    return strings
+
+
+def _read_date_styles(archive, path):
+    """
+    Find which cell style indices format numbers as dates/durations
+
+    Returns:
+        Tuple of (date_style_ids, timedelta_style_ids) - both sets of ints
+    """
+    date_styles = set()
+    timedelta_styles = set()
+    if path is None or path not in archive.namelist():
+        return date_styles, timedelta_styles
+
+    styles = ET.fromstring(archive.read(path))
+    formats = dict(BUILTIN_FORMATS)
+    for num_fmt in styles.iterfind(f'{MAIN_NS}numFmts/{MAIN_NS}numFmt'):
+        formats[int(num_fmt.get('numFmtId'))] = num_fmt.get('formatCode')
+
+    for style_id, xf in enumerate(styles.iterfind(f'{MAIN_NS}cellXfs/{MAIN_NS}xf')):
+        number_format = formats.get(int(xf.get('numFmtId', 0)))
+        if is_date_format(number_format):
+            date_styles.add(style_id)
+            if is_timedelta_format(number_format):
+                timedelta_styles.add(style_id)
+
+    return date_styles, timedelta_styles
+
+
+def sheet_max_row(file_path):
+    """
+    Get the number of rows in the active sheet of an .xlsx file from its dimension
+
+    The dimension (e.g. ref="A1:FW24657") sits ahead of the cell data, so only the
+    top of the sheet XML is read. Files saved in write-only mode have no dimension -
+    counting their rows would mean parsing the whole sheet, so None is returned instead
+
+    Args:
+        file_path: Path to the .xlsx file
+
+    Returns:
+        Last row number, or None if the sheet has no dimension
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        sheet_path = _workbook_parts(archive)[0]
+        with archive.open(sheet_path) as sheet:
+            for _, element in ET.iterparse(sheet, events=('start',)):
+                if element.tag == DIMENSION_TAG:
+                    last_cell = element.get('ref', '').split(':')[-1]
+                    row_digits = last_cell.lstrip('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+                    return int(row_digits) if row_digits else None
+                if element.tag == SHEET_DATA_TAG:
+                    return None  # Cell data reached without a dimension
+    return None
+
+
+def iter_rows(file_path, min_row=1, max_row=None, columns=None, where=None):
+    """
+    Stream row values from the active sheet of an .xlsx file
+
+    Args:
+        file_path: Path to the .xlsx file
+        min_row: First row to yield (1-based, like openpyxl)
+        max_row: Last row to yield (None = read to the end of the sheet)
+        columns: Column letters to extract, e.g. ('D', 'W')
+                 None = yield every column of the row
+        where: Optional (column_letter, predicate) filter, e.g. ('B', is_match)
+               Only that cell is decoded first - rows where predicate(value)
+               is false are yielded as None without decoding anything else
+
+    Yields:
+        List of cell values per row - one value per requested column in the
+        order given, or the full row (padded to the sheet width) if columns is None
+        (None for rows rejected by the where filter)
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        sheet_path, strings_path, styles_path, epoch = _workbook_parts(archive)
+        shared_strings = _read_shared_strings(archive, strings_path)
+        date_styles, timedelta_styles = _read_date_styles(archive, styles_path)
+
+        def decode(cell):
+            """Convert a <c> element to its Python value (openpyxl data_only semantics)"""
+            data_type = cell.get('t', 'n')
+
+            if data_type == 'inlineStr':
+                inline = cell.find(INLINE_TAG)
+                return _read_text(inline) if inline is not None else None
+
+            value = cell.findtext(VALUE_TAG) or None
+            if value is None:
+                return None
+
+            if data_type == 'n':
+                if '.' in value or 'E' in value or 'e' in value:
+                    value = float(value)
+                else:
+                    value = int(value)
+                style_id = int(cell.get('s', 0))
+                if style_id in date_styles:
+                    try:
+                        value = from_excel(value, epoch, timedelta=style_id in timedelta_styles)
+                    except (OverflowError, ValueError):
+                        value = '#VALUE!'  # Out-of-range serial, openpyxl treats it as an error
+                return value
+            if data_type == 's':
+                return shared_strings[int(value)]
+            if data_type == 'b':
+                return bool(int(value))
+            if data_type == 'd':
+                return from_ISO8601(value)
+            return value  # 'str' (formula result) and 'e' (error)
+
+        # Map wanted column index → output position
+        wanted = None
+        if columns is not None:
+            wanted = {column_index(letters): position for position, letters in enumerate(columns)}
+
+        where_column = where_predicate = None
+        if where is not None:
+            where_column = column_index(where[0])
+            where_predicate = where[1]
+
+        width = 0
+        next_row = 1
+
+        with archive.open(sheet_path) as sheet:
+            for _, element in ET.iterparse(sheet, events=('end',)):
+                if element.tag != ROW_TAG:
+                    if element.tag == DIMENSION_TAG:
+                        # e.g. ref="A1:FW24657" → pad full rows out to column FW
+                        last_cell = element.get('ref', '').split(':')[-1]
+                        width = column_index(last_cell.rstrip(DIGITS) or 'A')
+                    continue
+
+                row_num = int(element.get('r', next_row))
+
+                # Fill any rows the XML skips (openpyxl yields empty rows for these)
+                last_gap = row_num if max_row is None else min(row_num, max_row + 1)
+                for _ in range(max(next_row, min_row), last_gap):
+                    if where_predicate is not None and not where_predicate(None):
+                        yield None
+                    else:
+                        yield [None] * (len(wanted) if wanted is not None else width)
+                next_row = row_num + 1
+
+                if max_row is not None and row_num > max_row:
+                    return
+
+                if where_predicate is not None and row_num >= min_row:
+                    # Decode just the filter cell before touching the rest of the row
+                    key_value = None
+                    col_idx = 0
+                    for cell in element:
+                        ref = cell.get('r')
+                        col_idx = column_index(ref.rstrip(DIGITS)) if ref else col_idx + 1
+                        if col_idx >= where_column:
+                            if col_idx == where_column:
+                                key_value = decode(cell)
+                            break
+                    if not where_predicate(key_value):
+                        element.clear()
+                        yield None
+                        continue
+
+                if wanted is not None:
+                    values = [None] * len(wanted)
+                else:
+                    values = [None] * width
+
+                col_idx = 0
+                for cell in element:
+                    ref = cell.get('r')
+                    col_idx = column_index(ref.rstrip(DIGITS)) if ref else col_idx + 1
+
+                    if wanted is not None:
+                        # Skip unwanted columns without decoding them
+                        position = wanted.get(col_idx)
+                        if position is not None:
+                            values[position] = decode(cell)
+                    else:
+                        if col_idx > len(values):
+                            values.extend([None] * (col_idx - len(values)))
+                        values[col_idx - 1] = decode(cell)
+
+                if wanted is None:
+                    width = len(values)
+
+                element.clear()
+                if row_num >= min_row:
+                    yield values